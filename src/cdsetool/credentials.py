@@ -104,6 +104,7 @@ class Credentials:  # pylint: disable=too-few-public-methods disable=too-many-in
         self.__refresh_token_expires: datetime = self.__access_token_expires
 
         self.__lock = threading.Lock()
+        self.__local = threading.local()
 
         if self.__username is None or self.__password is None:
             self.__read_credentials()
@@ -113,8 +114,17 @@ class Credentials:  # pylint: disable=too-few-public-methods disable=too-many-in
     def get_session(self) -> requests.Session:
         """
         Returns a session with the credentials set as the Authorization header
+
+        Sessions are reused per thread to keep connections alive between
+        requests. The Authorization header is refreshed on every call.
         """
-        return self.make_session(self, True, self.RETRIES, self.__proxies)
+        self.__ensure_tokens()
+        session = getattr(self.__local, "session", None)
+        if session is None:
+            session = self.make_session(self, False, self.RETRIES, self.__proxies)
+            self.__local.session = session
+        session.headers.update({"Authorization": f"Bearer {self.__access_token}"})
+        return session
 
     @staticmethod
     def make_session(
@@ -7,10 +7,10 @@ all features in a result set.
 
 import os
 import random
-import tempfile
+import re
 import time
 import shutil
-from typing import Any, Dict, Generator, Union
+from typing import Any, Dict, Generator, Tuple, Union
 
 from requests import Session
 from requests.exceptions import ChunkedEncodingError
@@ -22,9 +22,18 @@ from cdsetool.credentials import (
     TokenExpiredSignatureError,
 )
 from cdsetool.logger import NoopLogger
-from cdsetool.monitor import NoopMonitor, StatusMonitor
+from cdsetool.monitor import NoopMonitor, Status, StatusMonitor
 from cdsetool.query import FeatureQuery
 
+# Streaming throughput plateaus at a few hundred KiB per read; larger chunks
+# only add copying overhead. Override with options["chunk_size"].
+CHUNK_SIZE = 256 * 1024
+
+# Retry delays are drawn uniformly from [0, min(cap, base * 2 ** attempt)]
+# seconds. Override with options["backoff_base"] and options["backoff_cap"].
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
 
 def download_feature(
     feature, path: str, options: Union[Dict[str, Any], None] = None
@@ -34,67 +43,131 @@ def download_feature(
 
     Returns the feature ID
     """
-    options = options or {}
+    return _download_feature(feature, path, options or {}, check_existing=True)
+
+
+def _download_feature(
+    feature, path: str, options: Dict[str, Any], check_existing: bool
+) -> Union[str, None]:
     log = _get_logger(options)
     url = _get_feature_url(feature)
-    title = feature.get("properties").get("title")
+    filename = _get_feature_filename(feature)
 
-    if not url or not title:
-        log.debug(f"Bad URL ('{url}') or title ('{title}')")
+    if not url or not filename:
+        log.debug(f"Bad URL ('{url}') or filename ('{filename}')")
         return None
 
-    filename = title.replace(".SAFE", ".zip")
     result_path = os.path.join(path, filename)
 
-    if not options.get("overwrite_existing", False) and os.path.exists(result_path):
+    if (
+        check_existing
+        and not options.get("overwrite_existing", False)
+        and os.path.exists(result_path)
+    ):
         log.debug(f"File {result_path} already exists, skipping..")
         return filename
 
-    with _get_monitor(options).status() as status:
-        status.set_filename(filename)
-        attempts = 0
-        while attempts < 10:
-            attempts += 1
-            # Always get a new session, credentials might have expired.
-            try:
-                session = _get_credentials(options).get_session()
-            except TokenClientConnectionError as e:
-                log.warning(e)
-                continue
-            except TokenExpiredSignatureError:
-                log.warning("Token signature expired, retrying..")
-                continue
-            url = _follow_redirect(url, session)
-            with session.get(url, stream=True) as response:
-                if response.status_code != 200:
-                    log.warning(f"Status code {response.status_code}, retrying..")
-                    time.sleep(60 * (1 + (random.random() / 4)))
-                    continue
+    # Download next to the result, so publishing it is an atomic rename
+    temp_path = f"{result_path}.part"
+    fd = _create_partial(temp_path, log)
+    try:
+        with _get_monitor(options).status() as status, os.fdopen(fd, "wb") as file:
+            status.set_filename(filename)
+            downloaded = _download_to_file(url, file, status, options)
+        if downloaded:
+            os.replace(temp_path, result_path)
+            return filename
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
-                status.set_filesize(int(response.headers["Content-Length"]))
-
-                with tempfile.NamedTemporaryFile() as file:
-                    # Server might not send all bytes specified by the
-                    # Content-Length header before closing connection.
-                    # Log as a warning and try again.
-                    try:
-                        for chunk in response.iter_content(chunk_size=1024 * 1024 * 5):
-                            file.write(chunk)
-                            status.add_progress(len(chunk))
-                    except (
-                        ChunkedEncodingError,
-                        ConnectionResetError,
-                        ProtocolError,
-                    ) as e:
-                        log.warning(e)
-                        continue
-                    shutil.copy(file.name, result_path)
-
-                return filename
     log.error(f"Failed to download {filename}")
     return None
 
 
+def _create_partial(temp_path: str, log) -> int:
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    try:
+        return os.open(temp_path, flags, 0o666)
+    except FileExistsError:
+        # Left behind by an interrupted run. It is preallocated to full size,
+        # so the downloaded part can not be told apart and it is started over.
+        log.debug(f"Replacing partial download {temp_path}")
+        os.remove(temp_path)
+        return os.open(temp_path, flags, 0o666)
+
+
+def _download_to_file(url: str, file, status: Status, options: Dict) -> bool:
+    log = _get_logger(options)
+    chunk_size = options.get("chunk_size", CHUNK_SIZE)
+    credentials = None
+    forgot_redirect = False
+    attempts = 0
+    while attempts < 10:
+        attempts += 1
+        # Refresh the session, credentials might have expired.
+        try:
+            # Reuse the credentials between attempts, only refresh their tokens
+            credentials = credentials or _get_credentials(options)
+            session = credentials.get_session()
+        except TokenClientConnectionError as e:
+            log.warning(e)
+            continue
+        except TokenExpiredSignatureError:
+            log.warning("Token signature expired, retrying..")
+            continue
+        download_url, cached_redirect = _follow_redirect(url, session)
+        # Resume from the bytes kept by a previous, interrupted attempt
+        offset = file.tell()
+        # Products are zip archives, ask for them as they are. Offsets, sizes
+        # and Range requests all count the bytes on the wire.
+        headers = {"Accept-Encoding": "identity"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        with session.get(download_url, stream=True, headers=headers) as response:
+            if response.status_code == 416:
+                log.warning("Partial download can not be resumed, restarting..")
+                _discard_partial(file, status)
+                continue
+
+            if response.status_code not in (200, 206):
+                # A cached redirect might be stale, resolve it again once. A
+                # freshly resolved URL that is gone is a permanent error.
+                if (
+                    response.status_code in (404, 410)
+                    and cached_redirect
+                    and not forgot_redirect
+                ):
+                    log.warning("Cached redirect is stale, retrying..")
+                    _forget_redirect(url)
+                    forgot_redirect = True
+                    continue
+                if _is_permanent_error(response.status_code):
+                    log.error(f"Status code {response.status_code}, giving up..")
+                    return False
+                log.warning(f"Status code {response.status_code}, retrying..")
+                _retry_backoff(attempts, options, response.headers.get("Retry-After"))
+                continue
+
+            if response.status_code == 200 and offset:
+                # Server ignored the Range header, start over
+                _discard_partial(file, status)
+                offset = 0
+
+            size = _expected_size(response, offset)
+            if size is None:
+                log.warning("Server resumed at the wrong offset, restarting..")
+                _discard_partial(file, status)
+                continue
+
+            status.set_filesize(size)
+            _preallocate(file, status.size)
+
+            if _copy_body(response, file, status, chunk_size, log):
+                return True
+    return False
+
+
 def download_features(
     features: FeatureQuery, path: str, options: Union[Dict[str, Any], None] = None
 ) -> Generator[Union[str, None], None, None]:
@@ -111,27 +184,184 @@ def download_features(
     options["monitor"] = _get_monitor(options)
     options["monitor"].start()
 
-    def _download_feature(feature) -> Union[str, None]:
-        return download_feature(feature, path, options)
+    # Scan the output directory once instead of stat'ing every result path
+    existing = set()
+    if not options.get("overwrite_existing", False) and os.path.isdir(path):
+        with os.scandir(path) as entries:
+            existing = {entry.name for entry in entries}
+
+    def _download_unless_existing(feature) -> Union[str, None]:
+        filename = _get_feature_filename(feature)
+        if filename and filename in existing:
+            options["logger"].debug(f"File {filename} already exists, skipping..")
+            return filename
+        # Already checked against the scan, don't stat the result path again
+        return _download_feature(feature, path, options, check_existing=False)
 
     yield from _concurrent_process(
-        _download_feature, features, options.get("concurrency", 1)
+        _download_unless_existing, features, options.get("concurrency", 1)
     )
 
     options["monitor"].stop()
 
 
-def _get_feature_url(feature) -> str:
-    return feature.get("properties").get("services").get("download").get("url")
+class _ProgressWriter:  # pylint: disable=too-few-public-methods
+    """
+    Wraps a file, reporting every write to a download status
+    """
+
+    def __init__(self, file, status: Status) -> None:
+        self.__file = file
+        self.__status = status
+
+    def write(self, data: bytes) -> int:
+        """
+        Write data to the file and add its length to the status progress
+        """
+        written = self.__file.write(data)
+        self.__status.add_progress(len(data))
+        return written
+
+
+def _get_feature_url(feature) -> Union[str, None]:
+    try:
+        return feature["properties"]["services"]["download"]["url"]
+    except (KeyError, TypeError):
+        return None
+
+
+def _get_feature_filename(feature) -> Union[str, None]:
+    try:
+        title = feature["properties"]["title"]
+    except (KeyError, TypeError):
+        return None
+    if title and title.endswith(".SAFE"):
+        return f"{title[:-5]}.zip"
+    return title or None
+
 
+# Download URLs of a collection all redirect to the same host and path, only
+# the trailing product segment differs. Maps source prefix -> target prefix.
+_redirects: Dict[str, str] = {}
 
-def _follow_redirect(url: str, session: Session) -> str:
+
+def _follow_redirect(url: str, session: Session) -> Tuple[str, bool]:
+    """
+    Returns the final download URL, and whether it came from the redirect cache
+    """
+    prefix, _, name = url.rpartition("/")
+    target = _redirects.get(prefix)
+    if target:
+        return f"{target}/{name}", True
+
+    source = url
     response = session.head(url, allow_redirects=False)
-    while response.status_code in range(300, 400):
+    while 300 <= response.status_code < 400:
         url = response.headers["Location"]
         response = session.head(url, allow_redirects=False)
 
-    return url
+    target, _, target_name = url.rpartition("/")
+    if url != source and target_name == name:
+        _redirects[prefix] = target
+
+    return url, False
+
+
+def _forget_redirect(url: str) -> None:
+    _redirects.pop(url.rpartition("/")[0], None)
+
+
+def _expected_size(response, offset: int) -> Union[int, None]:
+    # Size of the file once the response is written at offset, or None when a
+    # partial response does not start at offset
+    size = offset + int(response.headers["Content-Length"])
+    if response.status_code != 206:
+        return size
+
+    start, total = _parse_content_range(response.headers.get("Content-Range"))
+    if start != offset:
+        return None
+    return total or size
+
+
+def _copy_body(response, file, status: Status, chunk_size: int, log) -> bool:
+    # Server might not send all bytes specified by the
+    # Content-Length header before closing connection.
+    # Log as a warning and resume on the next attempt.
+    try:
+        response.raw.decode_content = False
+        shutil.copyfileobj(response.raw, _ProgressWriter(file, status), chunk_size)
+    except (
+        ChunkedEncodingError,
+        ConnectionResetError,
+        ProtocolError,
+    ) as e:
+        log.warning(e)
+        return False
+
+    # A body that ends early without an error would otherwise be
+    # published with the zero-filled tail of the preallocated file
+    if file.tell() != status.size:
+        log.warning("Download ended before Content-Length, resuming..")
+        return False
+
+    return True
+
+
+def _parse_content_range(
+    content_range: Union[str, None]
+) -> Tuple[Union[int, None], Union[int, None]]:
+    # "bytes <start>-<end>/<total>", where the total may be "*" when unknown
+    match = re.fullmatch(r"bytes (\d+)-\d+/(\d+|\*)", (content_range or "").strip())
+    if not match:
+        return None, None
+    total = match.group(2)
+    return int(match.group(1)), int(total) if total != "*" else None
+
+
+def _preallocate(file, size: int) -> None:
+    # Reserve the whole file up front, letting the filesystem allocate it in
+    # as few extents as possible instead of growing it write by write.
+    if not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(file.fileno(), 0, size)
+    except OSError:
+        # Not supported by every filesystem, e.g. some network mounts
+        pass
+
+
+def _discard_partial(file, status: Status) -> None:
+    status.add_progress(-file.tell())
+    file.seek(0)
+    file.truncate()
+
+
+def _is_permanent_error(status_code: int) -> bool:
+    # Client errors will not go away by retrying, except for expired tokens,
+    # timeouts and rate limiting
+    return 400 <= status_code < 500 and status_code not in (401, 408, 429)
+
+
+def _retry_backoff(
+    attempts: int, options: Dict, retry_after: Union[str, None] = None
+) -> None:
+    base = options.get("backoff_base", BACKOFF_BASE)
+    cap = options.get("backoff_cap", BACKOFF_CAP)
+
+    # Only the delay-seconds form of Retry-After is honoured, never for longer
+    # than the cap. HTTP dates and invalid values fall back to the backoff.
+    try:
+        delay = int(retry_after or "")
+    except ValueError:
+        delay = -1
+    if delay >= 0:
+        time.sleep(min(delay, cap))
+        return
+
+    # Full jitter spreads out retries from concurrent workers, instead of
+    # having all of them hit a rate limited server again at the same time.
+    time.sleep(random.uniform(0, min(cap, base * 2**attempts)))
 
 
 def _get_logger(options: Dict) -> NoopLogger:
@@ -14,7 +14,9 @@ import sys
 import os
 import signal
 import shutil
-from typing import List, Tuple, Union
+from bisect import bisect_right
+from collections import deque
+from typing import Deque, List, Tuple, Union
 
 IS_IPYTHON = True
 
@@ -30,7 +32,7 @@ except AttributeError:
     IS_IPYTHON = False
 
 
-class StatusMonitor(threading.Thread):
+class StatusMonitor(threading.Thread):  # pylint: disable=too-many-instance-attributes
     """
     A monitor that prints a status bar for each download
 
@@ -48,26 +50,37 @@ class StatusMonitor(threading.Thread):
     """
 
     line_length: int = 80
-
-    __is_running: bool = True
-    __progress_lines: int = 0
-
-    __download_speed_deltas: List[int] = []
-    __done = []
-    __status = []
+    # Finished downloads listed in notebooks, where each frame clears the output
+    max_done_lines: int = 10
+
+    def __init__(self) -> None:
+        super().__init__(daemon=True)
+        self.__is_running = True
+        self.__progress_lines = 0
+        self.__download_speed_deltas: Deque[float] = deque(maxlen=10)
+        self.__done: List[Status] = []
+        self.__status: List[Status] = []
+        self.__downloaded_lock = threading.Lock()
+        self.__downloaded = 0
+        self.__stopped = threading.Event()
+        self.__changed = threading.Event()
+        self.__resized = False
+        self.__done_printed = 0
 
     def start(self) -> None:
         """
         Start the monitor
-        """
 
-        def _set_line_length(_signal_num, _stack):
-            self.line_length, _ = shutil.get_terminal_size()
+        Nothing is drawn when output is not a terminal or notebook, e.g. when
+        redirected to a log file, so no monitor thread is started
+        """
+        if not IS_IPYTHON and not sys.stdout.isatty():
+            return
 
-        _set_line_length(None, None)
+        self.line_length, _ = shutil.get_terminal_size()
 
         if os.name != "nt":
-            signal.signal(signal.SIGWINCH, _set_line_length)
+            signal.signal(signal.SIGWINCH, self.__on_resize)
 
         super().start()
 
@@ -76,6 +89,8 @@ class StatusMonitor(threading.Thread):
         Stop the monitor
         """
         self.__is_running = False
+        self.__stopped.set()
+        self.__changed.set()
 
     def status(self) -> "Status":
         """
@@ -83,30 +98,54 @@ class StatusMonitor(threading.Thread):
         """
         status = Status(self)
         self.__status.append(status)
+        self.__changed.set()
         return status
 
     def remove_status(self, status: "Status") -> None:
         """
         Remove a status from the monitor, marking it as done
         """
+        # Done downloads count with their full size
+        self.add_progress(status.size - status.downloaded)
         self.__done.append(status)
         self.__status.remove(status)
+        self.__changed.set()
+
+    def add_progress(self, chunk_bytes: int) -> None:
+        """
+        Add to the total number of bytes downloaded
+        """
+        with self.__downloaded_lock:
+            self.__downloaded += chunk_bytes
 
     def run(self) -> None:
         """
         Main loop for the monitor, printing the status bars every second until stopped
         """
+        last_frame = None
         while True:
             self.__track_download_speed()
             if self.__is_running is False:
                 break
 
-            self.__clear_progress_lines()
-            self.__print_done_lines()
+            # A burst of resize signals is coalesced into a single query
+            if self.__resized:
+                self.__resized = False
+                self.line_length, _ = shutil.get_terminal_size()
+
+            # Nothing to repaint when the downloads are stalled
+            frame = self.__frame_key()
+            if frame == last_frame:
+                continue
+            last_frame = frame
+
             self.__draw()
 
         print("")
 
+    def __on_resize(self, _signal_num, _stack) -> None:
+        self.__resized = True
+
     @property
     def __download_speed(self) -> float:
         if len(self.__download_speed_deltas) < 2:
@@ -114,58 +153,86 @@ class StatusMonitor(threading.Thread):
         return sum(self.__download_speed_deltas) / len(self.__download_speed_deltas)
 
     def __track_download_speed(self) -> None:
-        speed_t0 = self.__total_downloaded
-        time.sleep(1)
-        speed_t1 = self.__total_downloaded
-        self.__download_speed_deltas.append(speed_t1 - speed_t0)
-        if len(self.__download_speed_deltas) > 10:
-            self.__download_speed_deltas.pop(0)
-
-    def __print_done_lines(self) -> None:
-        for status in self.__done:
-            print(status.done_line())
-
-    def __clear_progress_lines(self) -> None:
-        if IS_IPYTHON:
-            clear_output(wait=True)  # type:ignore[reportPossiblyUnboundVariable]
+        bytes_t0 = self.__total_downloaded
+        time_t0 = time.monotonic()
+        # Redraw every second, or as soon as a download starts or finishes,
+        # but at most ten times a second. Wakes up immediately when stopped.
+        self.__changed.wait(1)
+        self.__changed.clear()
+        self.__stopped.wait(max(0.0, 0.1 - (time.monotonic() - time_t0)))
+        if self.__stopped.is_set():
             return
+        elapsed = time.monotonic() - time_t0
+        self.__download_speed_deltas.append(
+            (self.__total_downloaded - bytes_t0) / elapsed
+        )
 
-        sys.stdout.write("\033[K")
-        for _ in range(self.__progress_lines + 2):
-            sys.stdout.write("\033[F\033[K")
-
-        for _ in self.__done:
-            sys.stdout.write("\033[F\033[K")
-
-        print("")
-        print("")
+    def __frame_key(self) -> Tuple:
+        return (
+            self.line_length,
+            len(self.__done),
+            self.__total_downloaded,
+            int(self.__download_speed),
+            tuple((status.filename, status.size) for status in self.__status),
+        )
 
-    def __draw(self) -> None:
-        self.__progress_lines = 1
-
-        print(
-            " | ".join(
-                [
-                    "[[ ",
-                    f"{len(self.__status)} files in progress",
-                    f"{len(self.__done)} files done",
-                    f"{bytes_to_human(self.__total_downloaded)} total downloaded",
-                    f"{bytes_to_human(int(self.__download_speed))}/s ]]",
-                ]
-            )
+    def __done_lines(self) -> List[str]:
+        lines = []
+        if IS_IPYTHON:
+            # The whole output was cleared, list the most recent ones again
+            done = self.__done[-self.max_done_lines :]
+            if len(self.__done) > len(done):
+                lines.append(f"... {len(self.__done) - len(done)} earlier files done")
+        else:
+            # Done lines stay above the progress region, only print new ones
+            done = self.__done[self.__done_printed :]
+            self.__done_printed += len(done)
+
+        lines.extend(status.done_line() for status in done)
+        return lines
+
+    def __clear_progress_lines(self) -> str:
+        if IS_IPYTHON:
+            clear_output(wait=True)  # type:ignore[reportPossiblyUnboundVariable]
+            return ""
+
+        # Only the progress area of the last frame is redrawn, done lines printed
+        # above it stay on screen
+        return "\033[F\033[K" * self.__progress_lines
+
+    def __status_lines(self) -> List[str]:
+        line_length = self.line_length
+        header = " | ".join(
+            [
+                "[[ ",
+                f"{len(self.__status)} files in progress",
+                f"{len(self.__done)} files done",
+                f"{bytes_to_human(self.__total_downloaded)} total downloaded",
+                f"{bytes_to_human(int(self.__download_speed))}/s ]]",
+            ]
         )
+        lines = [header]
 
         for status in self.__status:
             filename_line, progress_line = status.status_lines()
-            print(filename_line.ljust(self.line_length, " "))
-            print(progress_line.ljust(self.line_length, " "))
-            self.__progress_lines += 2
+            lines.append(filename_line.ljust(line_length, " "))
+            lines.append(progress_line)
+
+        return lines
+
+    def __draw(self) -> None:
+        clear = self.__clear_progress_lines()
+        done_lines = self.__done_lines()
+        status_lines = self.__status_lines()
+        self.__progress_lines = len(status_lines)
+
+        # Write the whole frame at once, instead of a syscall per line
+        sys.stdout.write(clear + "\n".join(done_lines + status_lines) + "\n")
+        sys.stdout.flush()
 
     @property
     def __total_downloaded(self) -> int:
-        return sum(status.downloaded for status in self.__status) + sum(
-            status.size for status in self.__done
-        )
+        return self.__downloaded
 
     def __enter__(self):
         self.start()
@@ -191,6 +258,11 @@ class NoopMonitor:
         Remove a status from the monitor
         """
 
+    def add_progress(self, chunk_bytes: int) -> None:
+        """
+        Add to the total number of bytes downloaded
+        """
+
     def start(self) -> None:
         """
         Start the monitor
@@ -213,10 +285,7 @@ class Status:
     A status bar for a single download
     """
 
-    __monitor: Union[NoopMonitor, StatusMonitor, None] = None
-    filename: Union[str, None] = None
-    size: int = 0
-    downloaded: int = 0
+    __slots__ = ("__monitor", "filename", "size", "downloaded")
 
     def done_line(self) -> str:
         """
@@ -240,7 +309,7 @@ class Status:
         if self.downloaded == 0:
             return (
                 "Thread waiting for connection to start...",
-                f"[{' ' * (line_length - 2)}]",
+                f"[{_BAR_EMPTY[:line_length - 2]}]",
             )
 
         progress = self.downloaded / self.size
@@ -248,12 +317,10 @@ class Status:
             f"{self.filename[0:line_length - 6]} "
             + f"{bytes_to_human(self.size)} ({int(progress * 100)}%)"
         )
-        progress_line = (
-            "["
-            + f"{'█' * int(progress * (line_length - 2))}"
-            + f"{' ' * (line_length - int(progress * (line_length - 2)) - 2)}"
-            + "]"
-        )
+        # Progress can pass 100% when the server sends more than announced
+        filled = min(int(progress * (line_length - 2)), line_length - 2)
+        bar_empty = _BAR_EMPTY[: line_length - 2 - filled]
+        progress_line = f"[{_BAR_FILLED[:filled]}{bar_empty}]"
 
         return filename_line, progress_line
 
@@ -262,6 +329,8 @@ class Status:
         Add to the number of bytes downloaded
         """
         self.downloaded += chunk_bytes
+        if self.__monitor:
+            self.__monitor.add_progress(chunk_bytes)
 
     def set_filename(self, filename: str) -> None:
         """
@@ -275,8 +344,11 @@ class Status:
         """
         self.size = size
 
-    def __init__(self, monitor) -> None:
+    def __init__(self, monitor: Union[NoopMonitor, StatusMonitor, None]) -> None:
         self.__monitor = monitor
+        self.filename: Union[str, None] = None
+        self.size = 0
+        self.downloaded = 0
 
     def __enter__(self):
         return self
@@ -286,17 +358,20 @@ class Status:
             self.__monitor.remove_status(self)
 
 
+# Progress bars are sliced from these, instead of repeating characters per frame
+_BAR_FILLED = "█" * 4096
+_BAR_EMPTY = " " * 4096
+
+_UNITS = ("B", "KB", "MB", "GB", "TB")
+_UNIT_THRESHOLDS = (1000, 1000000, 1000000000, 1000000000000)
+
+
 def bytes_to_human(num_bytes: int) -> str:
     """
     Convert a number of bytes to a human-readable string
     """
-    if num_bytes < 1000:
+    unit = bisect_right(_UNIT_THRESHOLDS, num_bytes)
+    if unit == 0:
         return f"{num_bytes} B"
-    if num_bytes < 1000000:
-        return f"{num_bytes / 1000:.2f} KB"
-    if num_bytes < 1000000000:
-        return f"{num_bytes / 1000000:.2f} MB"
-    if num_bytes < 1000000000000:
-        return f"{num_bytes / 1000000000:.2f} GB"
-
-    return f"{num_bytes / 1000000000000:.2f} TB"
+
+    return f"{num_bytes / _UNIT_THRESHOLDS[unit - 1]:.2f} {_UNITS[unit]}"
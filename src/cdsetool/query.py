@@ -4,33 +4,26 @@ Query the Copernicus Data Space Ecosystem OpenSearch API
 https://documentation.dataspace.copernicus.eu/APIs/OpenSearch.html
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from typing import Any, Dict, Union
 from xml.etree import ElementTree
 from datetime import datetime, date
+from io import BytesIO
 import re
 import json
-import geopandas as gpd
+import os
+import threading
 from cdsetool.credentials import Credentials
 
+try:
+    import orjson  # type:ignore[reportMissingImports]
+except ImportError:
+    orjson = None  # pylint: disable=invalid-name
 
-class _FeatureIterator:
-    def __init__(self, feature_query) -> None:
-        self.index = 0
-        self.feature_query = feature_query
-
-    def __len__(self) -> int:
-        return len(self.feature_query)
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        try:
-            item = self.feature_query[self.index]
-            self.index += 1
-            return item
-        except IndexError as exc:
-            raise StopIteration from exc
+# Seconds to wait for a page. Bounds a prefetch that is still running when
+# iteration stops, which would otherwise hold up interpreter exit.
+PAGE_TIMEOUT = 120
 
 
 class FeatureQuery:
@@ -48,15 +41,37 @@ class FeatureQuery:
         collection: str,
         search_terms: Dict[str, Any],
         proxies: Union[Dict[str, str], None] = None,
+        validate: bool = True,
     ) -> None:
         self.features = []
         self.proxies = proxies
+        # Pages are fetched over one session, reusing its connection
+        self.__session = Credentials.make_session(
+            None, False, Credentials.RETRIES, proxies
+        )
+        self.__executor: Union[ThreadPoolExecutor, None] = None
+        self.__prefetched: Union[Future, None] = None
         self.next_url = _query_url(
-            collection, {**search_terms, "exactCount": "1"}, proxies=proxies
+            collection,
+            {**search_terms, "exactCount": "1"},
+            proxies=proxies,
+            validate=validate,
         )
 
     def __iter__(self):
-        return _FeatureIterator(self)
+        index = 0
+        try:
+            while True:
+                self.__fetch_through(index)
+                self.__prefetch_features()
+                fetched = len(self.features)
+                if index >= fetched:
+                    return
+                # Yield everything fetched so far, only check for more pages after
+                yield from self.features[index:fetched]
+                index = fetched
+        finally:
+            self.__stop_prefetching()
 
     def __len__(self) -> int:
         if self.total_results < 0:
@@ -65,82 +80,139 @@ class FeatureQuery:
         return self.total_results
 
     def __getitem__(self, index):
+        self.__fetch_through(index)
+        return self.features[index]
+
+    def __fetch_through(self, index: int) -> None:
         while index >= len(self.features) and self.next_url is not None:
             self.__fetch_features()
 
-        return self.features[index]
-
     def __fetch_features(self) -> None:
         if self.next_url is None:
             return
-        session = Credentials.make_session(
-            None, False, Credentials.RETRIES, self.proxies
-        )
-        with session.get(self.next_url) as response:
-            response.raise_for_status()
-            res = response.json()
-            self.features += res.get("features") or []
+        prefetched, self.__prefetched = self.__prefetched, None
+        if prefetched is not None:
+            res = prefetched.result()
+        else:
+            res = self.__get_page(self.next_url)
 
-            total_results = res.get("properties", {}).get("totalResults")
-            if total_results is not None:
-                self.total_results = total_results
+        self.features += res.get("features") or []
 
-            self.__set_next_url(res)
+        total_results = res.get("properties", {}).get("totalResults")
+        if total_results is not None:
+            self.total_results = total_results
+
+        self.__set_next_url(res)
+
+    def __prefetch_features(self) -> None:
+        # While iterating, fetch the next page in the background as the current
+        # one is consumed. It is only added to the features once it is needed.
+        if self.next_url is None:
+            self.__stop_prefetching()
+        elif self.__prefetched is None:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(max_workers=1)
+            self.__prefetched = self.__executor.submit(self.__get_page, self.next_url)
+
+    def __stop_prefetching(self) -> None:
+        # A page that is not requested yet is dropped. One already in flight
+        # finishes in the background, and is used by the next fetch.
+        if self.__prefetched is not None and self.__prefetched.cancel():
+            self.__prefetched = None
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+
+    def __get_page(self, url: str) -> Dict[str, Any]:
+        with self.__session.get(url, timeout=PAGE_TIMEOUT) as response:
+            response.raise_for_status()
+            # Pages can be several megabytes, use orjson when it is installed
+            if orjson is not None:
+                return orjson.loads(response.content)  # pylint: disable=no-member
+            return response.json()
 
     def __set_next_url(self, res) -> None:
         links = res.get("properties", {}).get("links") or []
-        self.next_url = next(
-            (link for link in links if link.get("rel") == "next"), {}
-        ).get("href")
+        next_url = next(
+            (link.get("href") for link in links if link.get("rel") == "next"), None
+        )
 
-        if self.next_url:
-            self.next_url = self.next_url.replace("exactCount=1", "exactCount=0")
+        # Only the first page needs to count the results
+        if next_url:
+            next_url = next_url.replace("exactCount=1", "exactCount=0")
+        self.next_url = next_url
 
 
 def query_features(
     collection: str,
     search_terms: Dict[str, Any],
     proxies: Union[Dict[str, str], None] = None,
+    validate: bool = True,
 ) -> FeatureQuery:
     """
     Returns an iterator over the features matching the search terms
+
+    Search terms are validated against the collection description, unless
+    validate is False. Invalid terms are then rejected by the API instead.
     """
-    return FeatureQuery(collection, {"maxRecords": 2000, **search_terms}, proxies)
+    return FeatureQuery(
+        collection, {"maxRecords": 2000, **search_terms}, proxies, validate
+    )
 
 
 def shape_to_wkt(shape: str) -> str:
     """
     Convert a shapefile to a WKT string
     """
+    # Reuse the result while the file is unchanged, e.g. when querying the same
+    # area for many dates
+    if os.path.isfile(shape):
+        return _cached_shape_to_wkt(shape, os.path.getmtime(shape))
+    return _shape_to_wkt(shape)
+
+
+@lru_cache(maxsize=32)
+def _cached_shape_to_wkt(shape: str, _mtime: float) -> str:
+    return _shape_to_wkt(shape)
+
+
+def _shape_to_wkt(shape: str) -> str:
+    # geopandas pulls in pandas, numpy and pyproj, only pay for it when needed
+    import geopandas as gpd  # pylint: disable=import-outside-toplevel
+
     coordinates = list(gpd.read_file(shape).geometry[0].exterior.coords)
-    return (
-        "POLYGON(("
-        + ", ".join(" ".join(map(str, coord)) for coord in coordinates)
-        + "))"
-    )
+    return _coordinates_to_wkt(coordinates)
 
 
 def geojson_to_wkt(geojson_in: Union[str, Dict]) -> str:
     """
     Convert a geojson geometry to a WKT string
     """
-    geojson = json.loads(geojson_in) if isinstance(geojson_in, str) else geojson_in
+    if isinstance(geojson_in, str):
+        return _geojson_str_to_wkt(geojson_in)
+    return _geojson_to_wkt(geojson_in)
 
+
+@lru_cache(maxsize=32)
+def _geojson_str_to_wkt(geojson: str) -> str:
+    return _geojson_to_wkt(json.loads(geojson))
+
+
+def _geojson_to_wkt(geojson: Dict) -> str:
     if geojson.get("type") == "Feature":
         geojson = geojson["geometry"]
     elif geojson.get("type") == "FeatureCollection" and len(geojson["features"]) == 1:
         geojson = geojson["features"][0]["geometry"]
 
-    coordinates = str(
-        tuple(item for sublist in geojson["coordinates"][0] for item in sublist)
-    )
-    paired_coord = ",".join(
-        [
-            f"{a}{b}"
-            for a, b in zip(coordinates.split(",")[0::2], coordinates.split(",")[1::2])
-        ]
+    return _coordinates_to_wkt(geojson["coordinates"][0])
+
+
+def _coordinates_to_wkt(coordinates) -> str:
+    return (
+        "POLYGON(("
+        + ", ".join(" ".join(map(str, coord)) for coord in coordinates)
+        + "))"
     )
-    return f"POLYGON({paired_coord})"
 
 
 def describe_collection(
@@ -149,29 +221,57 @@ def describe_collection(
     """
     Get a list of valid options for a given collection in key value pairs
     """
-    content = _get_describe_doc(collection, proxies=proxies)
-    tree = ElementTree.fromstring(content)
-    parameter_node_parent = tree.find(
-        "{http://a9.com/-/spec/opensearch/1.1/}Url[@type='application/json']"
-    )
+    parameters = _described_collections.get(collection)
+    if parameters is not None:
+        return parameters
+
+    # Concurrent queries for the same collection wait for a single fetch, other
+    # collections are described independently
+    with _describe_lock:
+        collection_lock = _describe_locks.setdefault(collection, threading.Lock())
+
+    with collection_lock:
+        parameters = _described_collections.get(collection)
+        if parameters is None:
+            content = _get_describe_doc(collection, proxies=proxies)
+            parameters = _parse_describe_doc(content)
+            _described_collections[collection] = parameters
+
+    return parameters
 
+
+def _parse_describe_doc(content: bytes) -> Dict[str, Any]:
+    # Stream the document, reading the parameters of the JSON search URL and
+    # dropping every element once it has been read
     parameters = {}
-    if not parameter_node_parent:
-        return parameters
-    for parameter_node in parameter_node_parent:
-        name = parameter_node.attrib.get("name")
-        pattern = parameter_node.attrib.get("pattern")
-        min_inclusive = parameter_node.attrib.get("minInclusive")
-        max_inclusive = parameter_node.attrib.get("maxInclusive")
-        title = parameter_node.attrib.get("title")
-
-        if name:
-            parameters[name] = {
-                "pattern": pattern,
-                "minInclusive": min_inclusive,
-                "maxInclusive": max_inclusive,
-                "title": title,
-            }
+    depth = 0
+    in_url = False
+    for event, element in ElementTree.iterparse(
+        BytesIO(content), events=("start", "end")
+    ):
+        if event == "start":
+            depth += 1
+            if (
+                depth == 2
+                and element.tag == "{http://a9.com/-/spec/opensearch/1.1/}Url"
+                and element.attrib.get("type") == "application/json"
+            ):
+                in_url = True
+            continue
+
+        depth -= 1
+        if in_url and depth == 1:
+            break
+        if in_url and depth == 2:
+            name = element.attrib.get("name")
+            if name:
+                parameters[name] = {
+                    "pattern": element.attrib.get("pattern"),
+                    "minInclusive": element.attrib.get("minInclusive"),
+                    "maxInclusive": element.attrib.get("maxInclusive"),
+                    "title": element.attrib.get("title"),
+                }
+        element.clear()
 
     return parameters
 
@@ -180,13 +280,15 @@ def _query_url(
     collection: str,
     search_terms: Dict[str, Any],
     proxies: Union[Dict[str, str], None] = None,
+    validate: bool = True,
 ) -> str:
-    description = describe_collection(collection, proxies=proxies)
+    description = describe_collection(collection, proxies=proxies) if validate else {}
 
     query_list = []
     for key, value in search_terms.items():
         val = _serialize_search_term(value)
-        _validate_search_term(key, val, description)
+        if validate:
+            _validate_search_term(key, val, description)
         query_list.append(f"{key}={val}")
 
     return (
@@ -199,77 +301,99 @@ def _serialize_search_term(search_term: Any) -> str:
     if isinstance(search_term, list):
         return ",".join(search_term)
 
-    if isinstance(search_term, datetime):
-        return search_term.strftime("%Y-%m-%dT%H:%M:%SZ")
-
     if isinstance(search_term, date):
-        return search_term.strftime("%Y-%m-%d")
+        # Aware datetimes at the same instant compare equal across timezones,
+        # but format differently, so the timezone is part of the cache key
+        return _serialize_date(search_term, getattr(search_term, "tzinfo", None))
 
     return str(search_term)
 
 
+@lru_cache(maxsize=1024)
+def _serialize_date(value: date, _tzinfo: Any) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    return value.strftime("%Y-%m-%d")
+
+
 def _validate_search_term(key: str, search_term: str, description) -> None:
     _assert_valid_key(key, description)
-    _assert_match_pattern(search_term, description.get(key).get("pattern"))
-    _assert_min_inclusive(search_term, description.get(key).get("minInclusive"))
-    _assert_max_inclusive(search_term, description.get(key).get("maxInclusive"))
+    entry = description[key]
+    _assert_match_pattern(search_term, entry.get("pattern"))
+    _assert_min_inclusive(search_term, entry.get("minInclusive"))
+    _assert_max_inclusive(search_term, entry.get("maxInclusive"))
 
 
 def _assert_valid_key(key: str, description: Dict[str, Any]) -> None:
-    assert key in description.keys(), (
-        f'search_term with name "{key}" '
-        + "was not found for collection."
-        + f" Available terms are: {', '.join(description.keys())}"
-    )
+    if key not in description:
+        raise ValueError(
+            f'search_term with name "{key}" '
+            + "was not found for collection."
+            + f" Available terms are: {', '.join(description.keys())}"
+        )
 
 
 def _assert_match_pattern(search_term: str, pattern: Union[str, None]) -> None:
     if not pattern:
         return
 
-    assert re.match(
-        pattern, search_term
-    ), f"search_term {search_term} does not match pattern {pattern}"
+    if not _compile_pattern(pattern).match(search_term):
+        raise ValueError(f"search_term {search_term} does not match pattern {pattern}")
+
+
+# Patterns come from the describe documents, compile each of them only once
+_compiled_patterns: Dict[str, re.Pattern] = {}
+
+
+def _compile_pattern(pattern: str) -> re.Pattern:
+    compiled = _compiled_patterns.get(pattern)
+    if compiled is None:
+        compiled = _compiled_patterns[pattern] = re.compile(pattern)
+    return compiled
 
 
 def _assert_min_inclusive(search_term: str, min_inclusive: Union[str, None]) -> None:
     if not min_inclusive:
         return
 
-    assert int(search_term) >= int(
-        min_inclusive
-    ), f"search_term {search_term} is less than min_inclusive {min_inclusive}"
+    if int(search_term) < int(min_inclusive):
+        raise ValueError(
+            f"search_term {search_term} is less than min_inclusive {min_inclusive}"
+        )
 
 
 def _assert_max_inclusive(search_term: str, max_inclusive: Union[str, None]) -> None:
     if not max_inclusive:
         return
 
-    assert int(search_term) <= int(
-        max_inclusive
-    ), f"search_term {search_term} is greater than max_inclusive {max_inclusive}"
+    if int(search_term) > int(max_inclusive):
+        raise ValueError(
+            f"search_term {search_term} is greater than max_inclusive {max_inclusive}"
+        )
 
 
-_describe_docs: Dict[str, bytes] = {}
+# Parsed describe documents, by collection
+_described_collections: Dict[str, Dict[str, Any]] = {}
+_describe_locks: Dict[str, threading.Lock] = {}
+_describe_lock = threading.Lock()
 
 
 def _get_describe_doc(
     collection: str, proxies: Union[Dict[str, str], None] = None
 ) -> bytes:
-    docs = _describe_docs.get(collection)
-    if docs:
-        return docs
     session = Credentials.make_session(None, False, Credentials.RETRIES, proxies)
     with session.get(
         "https://catalogue.dataspace.copernicus.eu"
         + f"/resto/api/collections/{collection}/describe.xml",
     ) as res:
-        assert res.status_code == 200, (
-            f"Unable to find collection with name {collection}. Please see "
-            + "https://documentation.dataspace.copernicus.eu"
-            + "/APIs/OpenSearch.html#collections "
-            + "for a list of available collections"
-        )
+        # Raising also keeps the failed collection out of the describe cache
+        if res.status_code != 200:
+            raise ValueError(
+                f"Unable to find collection with name {collection}. Please see "
+                + "https://documentation.dataspace.copernicus.eu"
+                + "/APIs/OpenSearch.html#collections "
+                + "for a list of available collections"
+            )
 
-        _describe_docs[collection] = res.content
         return res.content
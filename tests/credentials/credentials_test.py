@@ -4,6 +4,7 @@ import json
 import pytest
 import requests
 import datetime
+import threading
 import jwt
 import base64
 from cryptography.hazmat.primitives.asymmetric import rsa
@@ -222,6 +223,29 @@ def test_get_session(requests_mock, mocker) -> None:
     )
 
 
+def test_get_session_reused_per_thread(requests_mock, mocker) -> None:
+    _mock_openid(requests_mock)
+    _mock_token(requests_mock)
+    _mock_jwks(mocker)
+
+    credentials = Credentials("username", "password")
+    session = credentials.get_session()
+
+    assert credentials.get_session() is session
+
+    other_sessions = []
+    thread = threading.Thread(
+        target=lambda: other_sessions.append(credentials.get_session())
+    )
+    thread.start()
+    thread.join()
+
+    assert other_sessions[0] is not session
+    assert other_sessions[0].headers.get("Authorization") == session.headers.get(
+        "Authorization"
+    )
+
+
 def test_token_exchange(requests_mock, mocker) -> None:
     _mock_openid(requests_mock)
     _mock_token(requests_mock)
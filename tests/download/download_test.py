@@ -0,0 +1,351 @@
+import gzip
+
+import pytest
+import requests
+
+from cdsetool import download
+from cdsetool.download import download_feature, download_features
+from cdsetool.monitor import NoopMonitor
+
+URL = "https://catalogue.dataspace.copernicus.eu/download/P1"
+
+
+class _Credentials:
+    def get_session(self) -> requests.Session:
+        return requests.Session()
+
+
+def _feature(url: str = URL, title: str = "P1.SAFE"):
+    return {"properties": {"title": title, "services": {"download": {"url": url}}}}
+
+
+def _options():
+    return {"credentials": _Credentials(), "backoff_base": 0}
+
+
+@pytest.fixture(autouse=True)
+def _clear_redirects():
+    download._redirects.clear()
+    yield
+    download._redirects.clear()
+
+
+def test_download_short_body_is_resumed(requests_mock, tmp_path) -> None:
+    requests_mock.head(URL, status_code=200)
+    requests_mock.get(
+        URL,
+        [
+            {"content": b"a" * 500, "headers": {"Content-Length": "1024"}},
+            {
+                "status_code": 206,
+                "content": b"b" * 524,
+                "headers": {
+                    "Content-Length": "524",
+                    "Content-Range": "bytes 500-1023/1024",
+                },
+            },
+        ],
+    )
+
+    assert download_feature(_feature(), str(tmp_path), _options()) == "P1.zip"
+
+    assert (tmp_path / "P1.zip").read_bytes() == b"a" * 500 + b"b" * 524
+    gets = [r for r in requests_mock.request_history if r.method == "GET"]
+    assert gets[1].headers["Range"] == "bytes=500-"
+
+
+def test_retry_backoff_retry_after(monkeypatch) -> None:
+    sleeps = []
+    monkeypatch.setattr(download.time, "sleep", sleeps.append)
+
+    download._retry_backoff(1, {}, "5")
+    download._retry_backoff(1, {}, "86400")
+    download._retry_backoff(1, {"backoff_base": 1}, "Wed, 21 Oct 2015 07:28:00 GMT")
+    download._retry_backoff(1, {"backoff_base": 1}, "-1")
+
+    assert sleeps[0] == 5
+    assert sleeps[1] == download.BACKOFF_CAP
+    assert 0 <= sleeps[2] <= 2
+    assert 0 <= sleeps[3] <= 2
+
+
+def test_download_honours_retry_after(requests_mock, tmp_path, monkeypatch) -> None:
+    sleeps = []
+    monkeypatch.setattr(download.time, "sleep", sleeps.append)
+    requests_mock.head(URL, status_code=200)
+    requests_mock.get(
+        URL,
+        [
+            {"status_code": 429, "headers": {"Retry-After": "3"}},
+            {"content": b"data", "headers": {"Content-Length": "4"}},
+        ],
+    )
+
+    assert download_feature(_feature(), str(tmp_path), _options()) == "P1.zip"
+
+    assert sleeps == [3]
+    assert (tmp_path / "P1.zip").read_bytes() == b"data"
+
+
+@pytest.mark.parametrize("status_code", [400, 403, 404])
+def test_download_gives_up_on_client_errors(
+    requests_mock, tmp_path, status_code
+) -> None:
+    requests_mock.head(URL, status_code=200)
+    requests_mock.get(URL, status_code=status_code)
+
+    assert download_feature(_feature(), str(tmp_path), _options()) is None
+
+    assert len([r for r in requests_mock.request_history if r.method == "GET"]) == 1
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("status_code", [401, 408, 429, 500])
+def test_download_retries_transient_errors(
+    requests_mock, tmp_path, status_code
+) -> None:
+    requests_mock.head(URL, status_code=200)
+    requests_mock.get(
+        URL,
+        [
+            {"status_code": status_code},
+            {"content": b"data", "headers": {"Content-Length": "4"}},
+        ],
+    )
+
+    assert download_feature(_feature(), str(tmp_path), _options()) == "P1.zip"
+    assert (tmp_path / "P1.zip").read_bytes() == b"data"
+
+
+def _download_resumed(requests_mock, tmp_path, responses) -> bytes:
+    requests_mock.head(URL, status_code=200)
+    requests_mock.get(URL, responses)
+
+    path = tmp_path / "P1.zip.part"
+    with NoopMonitor().status() as status, open(path, "wb") as file:
+        file.write(b"abc")
+        assert download._download_to_file(URL, file, status, _options())
+
+    return path.read_bytes()
+
+
+def _range_headers(requests_mock) -> list:
+    return [
+        r.headers.get("Range")
+        for r in requests_mock.request_history
+        if r.method == "GET"
+    ]
+
+
+def test_download_resumes_with_range(requests_mock, tmp_path) -> None:
+    content = _download_resumed(
+        requests_mock,
+        tmp_path,
+        [
+            {
+                "status_code": 206,
+                "content": b"def",
+                "headers": {"Content-Length": "3", "Content-Range": "bytes 3-5/6"},
+            }
+        ],
+    )
+
+    assert content == b"abcdef"
+    assert _range_headers(requests_mock) == ["bytes=3-"]
+
+
+def test_download_restarts_after_416(requests_mock, tmp_path) -> None:
+    content = _download_resumed(
+        requests_mock,
+        tmp_path,
+        [
+            {"status_code": 416},
+            {"content": b"abcdef", "headers": {"Content-Length": "6"}},
+        ],
+    )
+
+    assert content == b"abcdef"
+    assert _range_headers(requests_mock) == ["bytes=3-", None]
+
+
+def test_download_discards_partial_when_range_is_ignored(
+    requests_mock, tmp_path
+) -> None:
+    content = _download_resumed(
+        requests_mock,
+        tmp_path,
+        [{"content": b"xyzxyz", "headers": {"Content-Length": "6"}}],
+    )
+
+    assert content == b"xyzxyz"
+    assert _range_headers(requests_mock) == ["bytes=3-"]
+
+
+def _mock_redirect(requests_mock, name: str, target: str) -> None:
+    source = f"https://catalogue.dataspace.copernicus.eu/download/{name}"
+    requests_mock.head(
+        source, status_code=302, headers={"Location": f"{target}/{name}"}
+    )
+    requests_mock.head(f"{target}/{name}", status_code=200)
+
+
+def _heads(requests_mock) -> list:
+    return [r.url for r in requests_mock.request_history if r.method == "HEAD"]
+
+
+def test_download_reuses_cached_redirect(requests_mock, tmp_path) -> None:
+    target = "https://zipper.dataspace.copernicus.eu/download"
+    for name in ("P1", "P2"):
+        _mock_redirect(requests_mock, name, target)
+        requests_mock.get(
+            f"{target}/{name}", content=b"data", headers={"Content-Length": "4"}
+        )
+
+    for name in ("P1", "P2"):
+        url = f"https://catalogue.dataspace.copernicus.eu/download/{name}"
+        feature = _feature(url, f"{name}.SAFE")
+        assert download_feature(feature, str(tmp_path), _options()) == f"{name}.zip"
+
+    assert _heads(requests_mock) == [
+        "https://catalogue.dataspace.copernicus.eu/download/P1",
+        f"{target}/P1",
+    ]
+    assert (tmp_path / "P2.zip").read_bytes() == b"data"
+
+
+def test_download_forgets_stale_redirect(requests_mock, tmp_path) -> None:
+    stale = "https://zipper.dataspace.copernicus.eu/download"
+    target = "https://zipper2.dataspace.copernicus.eu/download"
+    _mock_redirect(requests_mock, "P1", stale)
+    requests_mock.get(f"{stale}/P1", content=b"data", headers={"Content-Length": "4"})
+    _mock_redirect(requests_mock, "P2", target)
+    requests_mock.get(f"{stale}/P2", status_code=410)
+    requests_mock.get(f"{target}/P2", content=b"new", headers={"Content-Length": "3"})
+
+    for name in ("P1", "P2"):
+        url = f"https://catalogue.dataspace.copernicus.eu/download/{name}"
+        feature = _feature(url, f"{name}.SAFE")
+        assert download_feature(feature, str(tmp_path), _options()) == f"{name}.zip"
+
+    assert _heads(requests_mock)[2:] == [
+        "https://catalogue.dataspace.copernicus.eu/download/P2",
+        f"{target}/P2",
+    ]
+    assert (tmp_path / "P2.zip").read_bytes() == b"new"
+    assert download._redirects == {
+        "https://catalogue.dataspace.copernicus.eu/download": target
+    }
+
+
+def test_download_gives_up_on_missing_redirect_target(requests_mock, tmp_path) -> None:
+    target = "https://zipper.dataspace.copernicus.eu/download"
+    for name in ("P1", "P2"):
+        _mock_redirect(requests_mock, name, target)
+    requests_mock.get(f"{target}/P1", content=b"data", headers={"Content-Length": "4"})
+    requests_mock.get(f"{target}/P2", status_code=404)
+
+    url = "https://catalogue.dataspace.copernicus.eu/download/P1"
+    assert download_feature(_feature(url), str(tmp_path), _options()) == "P1.zip"
+
+    # The cached redirect is resolved again once, then the 404 is permanent
+    url = "https://catalogue.dataspace.copernicus.eu/download/P2"
+    assert download_feature(_feature(url, "P2.SAFE"), str(tmp_path), _options()) is None
+    gets = [r.url for r in requests_mock.request_history if r.method == "GET"]
+    assert gets[1:] == [f"{target}/P2", f"{target}/P2"]
+    assert _heads(requests_mock)[2:] == [url, f"{target}/P2"]
+
+
+def test_download_gives_up_on_missing_uncached_target(requests_mock, tmp_path) -> None:
+    target = "https://zipper.dataspace.copernicus.eu/download"
+    _mock_redirect(requests_mock, "P1", target)
+    requests_mock.get(f"{target}/P1", status_code=404)
+
+    assert download_feature(_feature(), str(tmp_path), _options()) is None
+    assert len([r for r in requests_mock.request_history if r.method == "GET"]) == 1
+
+
+def test_download_keeps_encoded_body(requests_mock, tmp_path) -> None:
+    body = gzip.compress(b"data" * 100)
+    requests_mock.head(URL, status_code=200)
+    requests_mock.get(
+        URL,
+        content=body,
+        headers={"Content-Length": str(len(body)), "Content-Encoding": "gzip"},
+    )
+
+    assert download_feature(_feature(), str(tmp_path), _options()) == "P1.zip"
+
+    assert (tmp_path / "P1.zip").read_bytes() == body
+    get = [r for r in requests_mock.request_history if r.method == "GET"][0]
+    assert get.headers["Accept-Encoding"] == "identity"
+
+
+def test_download_restarts_on_wrong_content_range(requests_mock, tmp_path) -> None:
+    content = _download_resumed(
+        requests_mock,
+        tmp_path,
+        [
+            {
+                "status_code": 206,
+                "content": b"cdef",
+                "headers": {"Content-Length": "4", "Content-Range": "bytes 2-5/6"},
+            },
+            {"content": b"abcdef", "headers": {"Content-Length": "6"}},
+        ],
+    )
+
+    assert content == b"abcdef"
+    assert _range_headers(requests_mock) == ["bytes=3-", None]
+
+
+def test_parse_content_range() -> None:
+    assert download._parse_content_range("bytes 3-5/6") == (3, 6)
+    assert download._parse_content_range("bytes 3-5/*") == (3, None)
+    assert download._parse_content_range("bytes */6") == (None, None)
+    assert download._parse_content_range(None) == (None, None)
+
+
+def test_download_replaces_leftover_partial(requests_mock, tmp_path) -> None:
+    (tmp_path / "P1.zip.part").write_bytes(b"\0" * 100)
+    requests_mock.head(URL, status_code=200)
+    requests_mock.get(URL, content=b"data", headers={"Content-Length": "4"})
+
+    assert download_feature(_feature(), str(tmp_path), _options()) == "P1.zip"
+
+    assert (tmp_path / "P1.zip").read_bytes() == b"data"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["P1.zip"]
+
+
+def test_download_features_skips_existing(requests_mock, tmp_path, monkeypatch) -> None:
+    (tmp_path / "P1.zip").write_bytes(b"old")
+    downloads = []
+    monkeypatch.setattr(
+        download, "_download_feature", lambda *args, **kwargs: downloads.append(args)
+    )
+
+    results = list(download_features([_feature()], str(tmp_path), _options()))
+
+    assert results == ["P1.zip"]
+    assert not downloads
+    assert not requests_mock.request_history
+    assert (tmp_path / "P1.zip").read_bytes() == b"old"
+
+
+def test_download_features_downloads_missing(requests_mock, tmp_path) -> None:
+    (tmp_path / "P2.zip").write_bytes(b"old")
+    requests_mock.head(URL, status_code=200)
+    requests_mock.get(URL, content=b"data", headers={"Content-Length": "4"})
+
+    results = list(download_features([_feature()], str(tmp_path), _options()))
+
+    assert results == ["P1.zip"]
+    assert (tmp_path / "P1.zip").read_bytes() == b"data"
+
+
+def test_get_feature_filename() -> None:
+    assert download._get_feature_filename(_feature(title="P1.SAFE")) == "P1.zip"
+    assert download._get_feature_filename(_feature(title="P1.SEN3")) == "P1.SEN3"
+    assert download._get_feature_filename(_feature(title="P1.SAFE.x")) == "P1.SAFE.x"
+    assert download._get_feature_filename(_feature(title="")) is None
+    assert download._get_feature_filename({"id": "P1"}) is None
+    assert download._get_feature_filename(None) is None
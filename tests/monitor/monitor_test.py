@@ -0,0 +1,129 @@
+import io
+import re
+import sys
+
+from cdsetool.monitor import NoopMonitor, StatusMonitor, bytes_to_human
+
+
+def test_total_downloaded() -> None:
+    monitor = StatusMonitor()
+
+    with monitor.status() as status:
+        status.set_filesize(1000)
+        status.add_progress(250)
+        status.add_progress(250)
+
+        assert monitor._StatusMonitor__total_downloaded == 500
+
+    # done downloads count with their full size
+    assert monitor._StatusMonitor__total_downloaded == 1000
+
+    with monitor.status() as status:
+        status.set_filesize(10)
+        status.add_progress(5)
+
+        assert monitor._StatusMonitor__total_downloaded == 1005
+
+
+def test_noop_monitor_status() -> None:
+    with NoopMonitor().status() as status:
+        status.set_filesize(1000)
+        status.add_progress(1000)
+
+        assert status.downloaded == 1000
+
+
+def test_bytes_to_human() -> None:
+    assert bytes_to_human(0) == "0 B"
+    assert bytes_to_human(999) == "999 B"
+    assert bytes_to_human(1000) == "1.00 KB"
+    assert bytes_to_human(1234567) == "1.23 MB"
+    assert bytes_to_human(999999999999) == "1000.00 GB"
+    assert bytes_to_human(1000000000000) == "1.00 TB"
+    assert bytes_to_human(5000000000000000) == "5000.00 TB"
+
+
+def test_no_thread_without_tty(monkeypatch) -> None:
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: False)
+    monitor = StatusMonitor()
+    monitor.start()
+
+    with monitor.status() as status:
+        status.set_filesize(10)
+        status.add_progress(10)
+
+    assert not monitor.is_alive()
+    assert monitor._StatusMonitor__total_downloaded == 10
+    monitor.stop()
+
+
+def test_monitors_do_not_share_state() -> None:
+    first = StatusMonitor()
+    second = StatusMonitor()
+
+    with first.status() as status:
+        status.set_filesize(10)
+        status.add_progress(10)
+
+    assert len(first._StatusMonitor__done) == 1
+    assert not second._StatusMonitor__done
+
+
+def _render(output: str) -> list:
+    """
+    Replay the output on a minimal terminal, returning the lines on screen
+    """
+    screen = [""]
+    row = 0
+    for token in re.split(r"(\033\[F|\033\[K|\n)", output):
+        if token == "\033[F":
+            row = max(row - 1, 0)
+        elif token == "\033[K":
+            screen[row] = ""
+        elif token == "\n":
+            row += 1
+            if row == len(screen):
+                screen.append("")
+        else:
+            screen[row] += token
+    return screen
+
+
+def test_draw_keeps_done_lines(monkeypatch) -> None:
+    monkeypatch.setattr("cdsetool.monitor.IS_IPYTHON", False)
+    stdout = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    monitor = StatusMonitor()
+
+    for index in range(4):
+        with monitor.status() as status:
+            status.set_filename(f"file{index}")
+            status.set_filesize(10)
+            status.add_progress(10)
+    monitor._StatusMonitor__draw()
+
+    with monitor.status() as status:
+        status.set_filename("file4")
+        status.set_filesize(10)
+        monitor._StatusMonitor__draw()
+        status.add_progress(10)
+    monitor._StatusMonitor__draw()
+
+    screen = _render(stdout.getvalue())
+    for index in range(5):
+        assert f"file{index} (10 B)" in screen
+    assert sum(line.startswith("[[ ") for line in screen) == 1
+
+
+def test_status_lines_above_full_progress() -> None:
+    monitor = StatusMonitor()
+    monitor.line_length = 80
+
+    with monitor.status() as status:
+        status.set_filename("file")
+        status.set_filesize(10)
+        status.add_progress(15)
+
+        _, progress_line = status.status_lines()
+
+    assert progress_line == "[" + "█" * 78 + "]"
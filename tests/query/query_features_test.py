@@ -1,4 +1,11 @@
-from cdsetool.query import query_features, FeatureQuery
+from cdsetool.query import (
+    describe_collection,
+    query_features,
+    FeatureQuery,
+    PAGE_TIMEOUT,
+)
+import threading
+
 import pytest
 import requests
 
@@ -104,3 +111,101 @@ def test_query_features_random_access(requests_mock) -> None:
         == "S1A_OPER_AUX_POEORB_OPOD_20210302T133908_V20140619T225944_20140621T005944.EOF"
     )
     assert len(query.features) == 40
+
+
+def test_describe_collection_parsed_once(requests_mock) -> None:
+    _mock_describe(requests_mock)
+
+    description = describe_collection("Sentinel1")
+
+    assert "maxRecords" in description
+    assert describe_collection("Sentinel1") is description
+
+
+def test_query_features_without_validation(requests_mock) -> None:
+    # The describe document is never requested, so it is not mocked
+    query = query_features(
+        "Sentinel2", {"maxRecords": 10, "notASearchTerm": "foo"}, validate=False
+    )
+
+    assert (
+        query.next_url
+        == "https://catalogue.dataspace.copernicus.eu/resto/api/collections/Sentinel2/search.json?maxRecords=10&notASearchTerm=foo&exactCount=1"
+    )
+
+
+def _page_requests(requests_mock) -> int:
+    return len([r for r in requests_mock.request_history if "search.json" in r.url])
+
+
+def test_query_features_prefetch(requests_mock) -> None:
+    _mock_describe(requests_mock)
+    _mock_sentinel_1(requests_mock)
+
+    query = query_features("Sentinel1", {"maxRecords": 10})
+
+    query[0]
+    assert _page_requests(requests_mock) == 1  # random access does not prefetch
+
+    iterator = iter(query)
+    next(iterator)
+    assert query._FeatureQuery__executor is not None
+
+    iterator.close()
+    assert query._FeatureQuery__executor is None  # stopped with the iteration
+
+    assert len(list(query)) == 48
+    assert query._FeatureQuery__executor is None
+    assert _page_requests(requests_mock) == 5
+
+
+def test_query_features_page_timeout(requests_mock) -> None:
+    _mock_describe(requests_mock)
+    _mock_sentinel_1(requests_mock)
+
+    # A prefetch left running when iteration stops must not hang forever
+    assert len(list(query_features("Sentinel1", {"maxRecords": 10}))) == 48
+    pages = [r for r in requests_mock.request_history if "search.json" in r.url]
+    assert pages and all(r.timeout == PAGE_TIMEOUT for r in pages)
+
+
+def test_describe_collection_does_not_block_other_collections(monkeypatch) -> None:
+    started = threading.Event()
+    release = threading.Event()
+    with open("tests/query/mock/sentinel_1/describe.xml", "rb") as file:
+        describe = file.read()
+
+    def get_describe_doc(collection, proxies=None):
+        if collection == "SlowCollection":
+            started.set()
+            release.wait(5)
+        return describe
+
+    monkeypatch.setattr("cdsetool.query._get_describe_doc", get_describe_doc)
+
+    slow = threading.Thread(target=describe_collection, args=("SlowCollection",))
+    slow.start()
+    try:
+        assert started.wait(5)
+        # Described while the other collection is still being fetched
+        assert "maxRecords" in describe_collection("FastCollection")
+        assert slow.is_alive()
+    finally:
+        release.set()
+        slow.join()
+
+
+def test_describe_collection_unknown(requests_mock) -> None:
+    url = "https://catalogue.dataspace.copernicus.eu/resto/api/collections/Unknown/describe.xml"
+    requests_mock.get(url, status_code=404)
+
+    with pytest.raises(ValueError):
+        describe_collection("Unknown")
+
+    # The failure is not cached
+    with open(
+        "tests/query/mock/sentinel_1/describe.xml", "r", encoding="utf-8"
+    ) as file:
+        requests_mock.get(url, text=file.read())
+
+    assert "maxRecords" in describe_collection("Unknown")
@@ -34,33 +34,33 @@ def test_validate_search_term() -> None:
     _validate_search_term("orbitNumber", "1", description)
     _validate_search_term("orbitNumber", "43212", description)
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _validate_search_term("productType", "foo", description)
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _validate_search_term("orbitNumber", "0", description)
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _validate_search_term("orbitNumber", "-100", description)
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _validate_search_term("orbitNumber", "foobar", description)
 
 
 def test_assert_valid_key() -> None:
     _assert_valid_key("someKey", {"someKey": True})
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _assert_valid_key("otherKey", {"someKey": True})
 
 
 def test_assert_match_pattern() -> None:
     pattern = "^[0-9]{4}-[0-9]{2}-[0-9]{2}(T[0-9]{2}:[0-9]{2}:[0-9]{2}(\\.[0-9]+)?(|Z|[\\+\\-][0-9]{2}:[0-9]{2}))?$"
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _assert_match_pattern("foo", pattern)
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _assert_match_pattern("01-01-2020", pattern)
 
     _assert_match_pattern("2020-01-01", None)
@@ -69,10 +69,10 @@ def test_assert_match_pattern() -> None:
 
     pattern = "^(asc|desc|ascending|descending)$"
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _assert_match_pattern("foo", pattern)
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _assert_match_pattern("01-01-2020", pattern)
 
     _assert_match_pattern("asc", pattern)
@@ -83,7 +83,7 @@ def test_assert_min_inclusive() -> None:
     _assert_min_inclusive("1", "1")
     _assert_min_inclusive("2", "1")
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _assert_min_inclusive("0", "1")
 
 
@@ -91,7 +91,7 @@ def test_assert_max_inclusive() -> None:
     _assert_max_inclusive("1", "1")
     _assert_max_inclusive("0", "1")
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(ValueError):
         _assert_max_inclusive("2", "1")
 
 